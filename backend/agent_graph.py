@@ -5,32 +5,44 @@ import uuid
 from typing import Annotated, Literal
 from typing_extensions import TypedDict
 
+import httpx
 from dotenv import load_dotenv
 
-from langchain_openai import ChatOpenAI
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_core.tools import tool
 from langchain_tavily import TavilySearch
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import HumanMessage, BaseMessage
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    RemoveMessage,
+    SystemMessage,
+    ToolMessage,
+)
 
 from langgraph.graph import StateGraph, START, END
-from langgraph.graph.message import add_messages
-from langgraph.prebuilt import ToolNode
+from langgraph.graph.message import add_messages, REMOVE_ALL_MESSAGES
+import asyncio
+import hashlib
+import json
+import logging
 import os
-import sqlite3
-from langgraph.checkpoint.sqlite import SqliteSaver
+import time
+
+import aiosqlite
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 from langgraph.types import Command, interrupt
 
+from db import SqliteConnectionPool
+from semantic_cache import SemanticCache
+
 load_dotenv("../.env")
 
 MODEL_NAME = "gpt-5-mini"
 
-DEBUG_MODE = True
-
-
-def print_debug(title: str, content: str) -> None:
-    if DEBUG_MODE:
-        print(f"\n🐛 [DEBUG] {title}:\n{content}\n" + "-" * 40)
+# Verbosity is driven by the LOG_LEVEL env var (configured in server.py);
+# logging defers argument formatting entirely when DEBUG is disabled.
+logger = logging.getLogger("agent")
 
 
 # ----------------------------
@@ -52,19 +64,91 @@ def format_tavily_results(tavily_response: dict) -> str:
 
     lines = []
     for i, r in enumerate(results, 1):
-        title = r.get("title", "")
+        # Cap each field so one verbose result cannot bloat the LLM context
+        title = (r.get("title") or "")[:200]
         # Fall back to raw_content in case content is thin (depending on settings)
         content = r.get("content") or r.get("raw_content") or ""
-        url = r.get("url", "")
+        if len(content) > 900:
+            content = content[:900] + "…"
+        url = (r.get("url") or "")[:300]
         lines.append(f"[{i}] {title}\n{content}\nsource: {url}")
     return "\n\n".join(lines)
 
 
+# Exact-match tier in front of the semantic cache: identical queries skip both
+# the Tavily round-trip and the embedding lookup. Stores the raw response JSON
+# so formatting changes do not invalidate entries.
+TAVILY_CACHE_TTL_SECONDS = 86400
+
+
+def _tavily_cache_key(query: str) -> str:
+    return hashlib.sha256(query.strip().lower().encode("utf-8")).hexdigest()
+
+
+_tavily_table_ready = False
+
+
+def _ensure_tavily_table() -> None:
+    global _tavily_table_ready
+    if _tavily_table_ready:
+        return
+    with _pool.write() as conn:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS tavily_cache ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, ts INTEGER NOT NULL)"
+        )
+        conn.commit()
+    _tavily_table_ready = True
+
+
+# Blocking sqlite helpers; only ever called through asyncio.to_thread so a
+# busy_timeout wait stalls a worker thread, not the event loop.
+def _tavily_cache_read(query: str) -> dict | None:
+    _ensure_tavily_table()
+    with _pool.read() as conn:
+        row = conn.execute(
+            "SELECT response FROM tavily_cache WHERE key = ? AND ts >= ?",
+            (_tavily_cache_key(query), int(time.time()) - TAVILY_CACHE_TTL_SECONDS),
+        ).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def _tavily_cache_write(query: str, response: dict) -> None:
+    _ensure_tavily_table()
+    now = int(time.time())
+    with _pool.write() as conn:
+        # Expired rows are invisible to reads but would otherwise pile up
+        # forever; sweep them out whenever we are writing anyway.
+        conn.execute(
+            "DELETE FROM tavily_cache WHERE ts < ?",
+            (now - TAVILY_CACHE_TTL_SECONDS,),
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO tavily_cache (key, response, ts) VALUES (?, ?, ?)",
+            (_tavily_cache_key(query), json.dumps(response), now),
+        )
+        conn.commit()
+
+
 @tool
-def tavily_search_formatted(query: str) -> str:
+async def tavily_search_formatted(query: str) -> str:
     """Web search (Tavily). Return formatted top results."""
-    tavily_response = tavily_search.invoke({"query": query})
-    return format_tavily_results(tavily_response)
+    hit = await asyncio.to_thread(_tavily_cache_read, query)
+    if hit is not None:
+        logger.debug("Exact cache hit (tool query): %s", query)
+        return format_tavily_results(hit)
+
+    cached = await tool_query_cache.get(query)
+    if cached is not None:
+        logger.debug("Semantic cache hit (tool query): %s", query)
+        return cached
+
+    tavily_response = await tavily_search.ainvoke({"query": query})
+    formatted = format_tavily_results(tavily_response)
+    if tavily_response.get("results"):
+        await asyncio.to_thread(_tavily_cache_write, query, tavily_response)
+        await tool_query_cache.put(query, formatted)
+    return formatted
 
 
 tools = [tavily_search_formatted]
@@ -73,16 +157,34 @@ tools = [tavily_search_formatted]
 # ----------------------------
 # State
 # ----------------------------
+def _merge_tool_memo(left: dict | None, right: dict | None) -> dict:
+    # Reducer for the per-thread tool memo; later entries win on collision.
+    return {**(left or {}), **(right or {})}
+
+
 class State(TypedDict):
     research_messages: Annotated[list[BaseMessage], add_messages]
     analysis_messages: Annotated[list[BaseMessage], add_messages]
     loop_count: int
+    # Original request theme, kept in state so a resume (which only receives
+    # a decision) can still key the theme cache on completion.
+    theme: str
+    # Memo of tool results for this thread, so the LLM repeating a query
+    # across loop iterations does not repeat the external call.
+    tool_query_memo: Annotated[dict[str, str], _merge_tool_memo]
 
 
 # ----------------------------
 # Model
 # ----------------------------
-model = ChatOpenAI(model=MODEL_NAME)
+# Shared HTTP clients with a larger keep-alive pool than httpx's default, so
+# the parallel market/technical calls and concurrent requests across threads
+# do not queue waiting for a free socket.
+_HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+_HTTP_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+_http_async_client = httpx.AsyncClient(limits=_HTTP_LIMITS, timeout=_HTTP_TIMEOUT)
+
+model = ChatOpenAI(model=MODEL_NAME, http_async_client=_http_async_client)
 model_with_tools = model.bind_tools(tools)
 
 
@@ -96,18 +198,19 @@ You are responsible for business research. For the user’s theme, investigate m
 If you write a prose summary after calling tools, add [n] only when you cite a source URL from the tool output as evidence, and include a reference list at the end. Do not fabricate sources.
 """
 
-research_prompt = ChatPromptTemplate.from_messages(
-    [
-        ("system", research_prompt_text),
-        MessagesPlaceholder(variable_name="research_messages"),
-    ]
-)
-research_chain = research_prompt | model_with_tools
+# Precomputed message objects: prompts here are fixed, so there is no need to
+# run ChatPromptTemplate formatting and placeholder resolution on every call —
+# each node just prepends its system message to the history.
+# NOTE: keep static content first so OpenAI's automatic prefix caching can
+# reuse the identical prefix across calls.
+RESEARCH_SYSTEM = SystemMessage(content=research_prompt_text)
 
 
-def research_agent(state: State) -> Command[Literal["tools", "summary_agent"]]:
-    print_debug("Node", "research_agent")
-    response = research_chain.invoke({"research_messages": state["research_messages"]})
+async def research_agent(state: State) -> Command[Literal["tools", "summary_agent"]]:
+    logger.debug("Node: %s", "research_agent")
+    response = await model_with_tools.ainvoke(
+        [RESEARCH_SYSTEM, *state["research_messages"]]
+    )
     update = {"research_messages": [response]}
     current_count = state.get("loop_count", 0)
 
@@ -119,82 +222,176 @@ def research_agent(state: State) -> Command[Literal["tools", "summary_agent"]]:
     return Command(update=update, goto="summary_agent")
 
 
-tool_node = ToolNode(tools, messages_key="research_messages")
+tools_by_name = {t.name: t for t in tools}
+
+# Cap concurrent tool executions so a single LLM turn with many tool calls
+# cannot exhaust sockets or the search API quota.
+_tool_semaphore = asyncio.Semaphore(4)
 
 
-def research_tool_node(state: State) -> Command[Literal["research_agent"]]:
-    result = tool_node.invoke({"research_messages": state["research_messages"]})
+async def _execute_tool_call(tool_call: dict) -> ToolMessage:
+    async with _tool_semaphore:
+        try:
+            output = await tools_by_name[tool_call["name"]].ainvoke(tool_call["args"])
+        except Exception as e:
+            output = f"(Error during tool execution) {type(e).__name__}: {e}"
+    content = output if isinstance(output, str) else str(output)
+    # Assign the id up front: add_messages dedupes by message id, and messages
+    # that arrive with one take its fast path instead of a linear scan.
+    return ToolMessage(
+        content=content,
+        name=tool_call["name"],
+        tool_call_id=tool_call["id"],
+        id=str(uuid.uuid4()),
+    )
 
-    last_message = result["research_messages"][-1]
-    tool_text = last_message.content
-    tool_text = tool_text if isinstance(tool_text, str) else str(tool_text)
-    print_debug("Tool Output", tool_text[:300] + "... (truncated)")
+
+def _memo_key(tool_call: dict) -> str:
+    args = tool_call.get("args") or {}
+    query = args.get("query")
+    if isinstance(query, str):
+        normalized = " ".join(query.strip().lower().split())
+        return f"{tool_call['name']}:{normalized}"
+    return f"{tool_call['name']}:{json.dumps(args, sort_keys=True)}"
+
+
+async def research_tool_node(state: State) -> Command[Literal["research_agent"]]:
+    # The LLM may request several searches in one turn; run them concurrently
+    # instead of ToolNode's serial execution. The LLM also tends to repeat
+    # queries across loop iterations, so results already seen on this thread
+    # (or duplicated within the turn) come from the memo instead of the tool.
+    last_message = state["research_messages"][-1]
+    tool_calls = getattr(last_message, "tool_calls", None) or []
+
+    memo = state.get("tool_query_memo") or {}
+    pending: dict[str, dict] = {}
+    for tc in tool_calls:
+        key = _memo_key(tc)
+        if key not in memo and key not in pending:
+            pending[key] = tc
+
+    executed = await asyncio.gather(
+        *(_execute_tool_call(tc) for tc in pending.values())
+    )
+    executed_by_key = dict(zip(pending.keys(), executed))
+
+    new_memo: dict[str, str] = {}
+    tool_messages: list[ToolMessage] = []
+    for tc in tool_calls:
+        key = _memo_key(tc)
+        if key in memo:
+            logger.debug("Tool memo hit: %s", key)
+            content = memo[key]
+        else:
+            content = executed_by_key[key].content
+            # Do not memoize failures; the next loop should retry them.
+            if not content.startswith("(Error"):
+                new_memo[key] = content
+        tool_messages.append(
+            ToolMessage(
+                content=content,
+                name=tc["name"],
+                tool_call_id=tc["id"],
+                id=str(uuid.uuid4()),
+            )
+        )
+
+    if logger.isEnabledFor(logging.DEBUG):
+        # Guarded: skip the str() + slice entirely when debug is off.
+        tool_text = tool_messages[-1].content if tool_messages else "(no tool calls)"
+        tool_text = tool_text if isinstance(tool_text, str) else str(tool_text)
+        logger.debug("Tool output: %s... (truncated)", tool_text[:300])
 
     return Command(
         update={
-            "research_messages": result["research_messages"],
+            "research_messages": tool_messages,
             "loop_count": state.get("loop_count", 0) + 1,
+            "tool_query_memo": new_memo,
         },
         goto="research_agent",
     )
 
 
-summary_prompt = ChatPromptTemplate.from_messages(
-    [
-        (
-            "system",
-            "You are an excellent scribe. Summarize the following “research log” and produce a base report that the market analysis team can use. For factual assertions, add [n] wherever possible and include a reference list at the end. Do not fabricate sources.",
-        ),
-        ("human", "Here is the research log:"),
-        MessagesPlaceholder(variable_name="research_messages"),
-        ("human", "Based on the above, produce a base report for market analysis."),
-    ]
+# Static content (system + fixed human messages) stays in front of the dynamic
+# history; only the trailing instruction follows it.
+SUMMARY_SYSTEM = SystemMessage(
+    content="You are an excellent scribe. Summarize the following “research log” and produce a base report that the market analysis team can use. For factual assertions, add [n] wherever possible and include a reference list at the end. Do not fabricate sources."
+)
+SUMMARY_LOG_INTRO = HumanMessage(content="Here is the research log:")
+SUMMARY_INSTRUCTION = HumanMessage(
+    content="Based on the above, produce a base report for market analysis."
 )
-summary_chain = summary_prompt | model
 
 
-def summary_agent(state: State) -> dict:
-    print_debug("Node", "summary_agent")
-    response = summary_chain.invoke({"research_messages": state["research_messages"]})
+def _condense_research_messages(messages: list[BaseMessage]) -> list[BaseMessage]:
+    """
+    Build a compact research log for the summarizer: keep human messages
+    verbatim, keep only the prose content of AI messages (tool-call argument
+    blobs add nothing to a summary), and reduce each tool output to a short
+    snippet plus its "source:" lines so citations stay possible.
+    """
+    condensed: list[BaseMessage] = []
+    for m in messages:
+        if isinstance(m, ToolMessage):
+            text = m.content if isinstance(m.content, str) else str(m.content)
+            sources = [line for line in text.splitlines() if line.startswith("source:")]
+            condensed.append(
+                HumanMessage(content="\n".join(["[tool output]", text[:300], *sources]))
+            )
+        elif isinstance(m, AIMessage):
+            text = m.content if isinstance(m.content, str) else str(m.content)
+            if text.strip():
+                condensed.append(AIMessage(content=text))
+        else:
+            condensed.append(m)
+    return condensed
+
+
+async def summary_agent(state: State) -> dict:
+    logger.debug("Node: %s", "summary_agent")
+    response = await model.ainvoke(
+        [
+            SUMMARY_SYSTEM,
+            SUMMARY_LOG_INTRO,
+            *_condense_research_messages(state["research_messages"]),
+            SUMMARY_INSTRUCTION,
+        ]
+    )
+    response.additional_kwargs["stage"] = "summary"
     return {"analysis_messages": [response]}
 
 
-market_prompt = ChatPromptTemplate.from_messages(
-    [
-        ("system", "You are a professional market analyst. Perform a SWOT analysis based on the report."),
-        MessagesPlaceholder(variable_name="analysis_messages"),
-    ]
+MARKET_SYSTEM = SystemMessage(
+    content="You are a professional market analyst. Perform a SWOT analysis based on the report."
+)
+TECHNICAL_SYSTEM = SystemMessage(
+    content="You are a CTO. Based on the market analysis, identify technical challenges and assess feasibility."
 )
-market_chain = market_prompt | model
 
 
-def market_agent(state: State) -> dict:
-    print_debug("Node", "market_agent")
-    response = market_chain.invoke({"analysis_messages": state["analysis_messages"]})
-    return {"analysis_messages": [response]}
+async def market_and_technical_agent(state: State) -> dict:
+    # Both analyses read the same analysis_messages and are independent of
+    # each other, so issue the two HTTP requests concurrently on one client,
+    # without an extra checkpoint write between the two agents.
+    logger.debug("Node: %s", "market_and_technical_agent")
+    messages = state["analysis_messages"]
+    market_response, technical_response = await asyncio.gather(
+        model.ainvoke([MARKET_SYSTEM, *messages]),
+        model.ainvoke([TECHNICAL_SYSTEM, *messages]),
+    )
+    market_response.additional_kwargs["stage"] = "market"
+    technical_response.additional_kwargs["stage"] = "technical"
+    return {"analysis_messages": [market_response, technical_response]}
 
 
-technical_prompt = ChatPromptTemplate.from_messages(
-    [
-        (
-            "system",
-            "You are a CTO. Based on the market analysis, identify technical challenges and assess feasibility.",
-        ),
-        MessagesPlaceholder(variable_name="analysis_messages"),
-    ]
+RETRY_COMPRESS_SYSTEM = SystemMessage(
+    content="Compress the following analysis thread into one concise base report that preserves the key findings of the summary, the SWOT analysis, and the technical assessment. Keep citation markers [n] and the reference list. The analysis team will redo their work with your text as the only context."
 )
-technical_chain = technical_prompt | model
 
 
-def technical_agent(state: State) -> dict:
-    print_debug("Node", "technical_agent")
-    response = technical_chain.invoke({"analysis_messages": state["analysis_messages"]})
-    return {"analysis_messages": [response]}
-
-
-def human_approval_node(
+async def human_approval_node(
     state: State,
-) -> Command[Literal["market_agent", "report_agent", "__end__"]]:
+) -> Command[Literal["market_and_technical_agent", "report_agent", "__end__"]]:
     payload = {
         "kind": "approval_request",
         "question": "Approve the work so far and generate the investor-facing report?",
@@ -218,28 +415,56 @@ def human_approval_node(
     if user_decision == "y":
         return Command(goto="report_agent")
     if user_decision == "retry":
-        return Command(goto="market_agent")
+        # Each retry appends a fresh market + technical pair, so the prompt
+        # for the next attempt grows without bound. Collapse the thread into
+        # a single compressed base report before re-entering the analysis.
+        compressed = await model.ainvoke(
+            [RETRY_COMPRESS_SYSTEM, *state["analysis_messages"]]
+        )
+        compressed.additional_kwargs["stage"] = "summary"
+        return Command(
+            update={
+                "analysis_messages": [
+                    RemoveMessage(id=REMOVE_ALL_MESSAGES),
+                    compressed,
+                ]
+            },
+            goto="market_and_technical_agent",
+        )
     return Command(goto=END)
 
 
-report_prompt = ChatPromptTemplate.from_messages(
-    [
-        (
-            "system",
-            """
+REPORT_SYSTEM = SystemMessage(
+    content="""
 Integrate everything discussed so far and produce a concrete investor-ready business plan.
 Do not add questions or suggestions at the end. End the document with “End of report”.
-""",
-        ),
-        MessagesPlaceholder(variable_name="analysis_messages"),
-    ]
+"""
 )
-report_chain = report_prompt | model
+
+_REPORT_STAGES = ("summary", "market", "technical")
 
 
-def report_agent(state: State) -> dict:
-    print_debug("Node", "report_agent")
-    response = report_chain.invoke({"analysis_messages": state["analysis_messages"]})
+def _compact_report_context(messages: list[BaseMessage]) -> list[BaseMessage]:
+    """
+    The report only needs the finished artifacts: the latest summary, market
+    and technical messages (tagged via additional_kwargs["stage"]). On retry
+    threads this skips the superseded attempts and keeps the report prompt
+    short. Falls back to the full history if no tags are present.
+    """
+    latest: dict[str, BaseMessage] = {}
+    for m in messages:
+        stage = getattr(m, "additional_kwargs", {}).get("stage")
+        if stage in _REPORT_STAGES:
+            latest[stage] = m
+    picked = [latest[s] for s in _REPORT_STAGES if s in latest]
+    return picked if picked else list(messages)
+
+
+async def report_agent(state: State) -> dict:
+    logger.debug("Node: %s", "report_agent")
+    response = await model.ainvoke(
+        [REPORT_SYSTEM, *_compact_report_context(state["analysis_messages"])]
+    )
     return {"analysis_messages": [response]}
 
 
@@ -250,32 +475,75 @@ builder = StateGraph(State)
 builder.add_node("research_agent", research_agent)
 builder.add_node("tools", research_tool_node)
 builder.add_node("summary_agent", summary_agent)
-builder.add_node("market_agent", market_agent)
-builder.add_node("technical_agent", technical_agent)
+builder.add_node("market_and_technical_agent", market_and_technical_agent)
 builder.add_node("human_approval", human_approval_node)
 builder.add_node("report_agent", report_agent)
 
 builder.add_edge(START, "research_agent")
-builder.add_edge("summary_agent", "market_agent")
-builder.add_edge("market_agent", "technical_agent")
-builder.add_edge("technical_agent", "human_approval")
+builder.add_edge("summary_agent", "market_and_technical_agent")
+builder.add_edge("market_and_technical_agent", "human_approval")
 builder.add_edge("report_agent", END)
 
 # A checkpointer is required for interrupt/resume (SQLite persistence).
 CHECKPOINT_DB_PATH = os.getenv("LANGGRAPH_CHECKPOINT_DB", "checkpoints.sqlite")
 
-# NOTE: check_same_thread=False is OK (assuming you handle locking for thread safety in your implementation) :contentReference[oaicite:3]{index=3}
-_conn = sqlite3.connect(CHECKPOINT_DB_PATH, check_same_thread=False)
+# Lazy sync pool for the caches (multiple WAL readers, one writer); no
+# connection is opened until the first cache access, so importing this module
+# for new_thread_id alone does no database I/O. Checkpointing itself goes
+# through a separate aiosqlite connection (see _get_graph_app below) so
+# checkpoint writes never block the event loop.
+_pool = SqliteConnectionPool(CHECKPOINT_DB_PATH, pool_size=4)
+
+_aconn: aiosqlite.Connection | None = None
+_graph_app = None
+_graph_app_lock = asyncio.Lock()
+
+
+async def _get_graph_app():
+    """
+    Lazily open the async checkpointer connection and compile the graph on
+    first use. AsyncSqliteSaver writes a checkpoint after every node, so the
+    async driver keeps those writes off the event loop.
+    """
+    global _aconn, _graph_app
+    async with _graph_app_lock:
+        if _graph_app is None:
+            _aconn = await aiosqlite.connect(CHECKPOINT_DB_PATH)
+            await _aconn.execute("PRAGMA journal_mode=WAL;")
+            await _aconn.execute("PRAGMA synchronous=NORMAL;")
+            await _aconn.execute("PRAGMA busy_timeout=5000;")
+            await _aconn.execute("PRAGMA cache_size=-65536;")  # 64 MiB page cache
+            await _aconn.execute("PRAGMA temp_store=MEMORY;")
+
+            checkpointer = AsyncSqliteSaver(_aconn)
+            await checkpointer.setup()  # Initialization such as table creation :contentReference[oaicite:4]{index=4}
+            _graph_app = builder.compile(checkpointer=checkpointer)
+    return _graph_app
 
-# Recommended PRAGMA settings for high-contention environments (optional, but often effective in production)
-_conn.execute("PRAGMA journal_mode=WAL;")
-_conn.execute("PRAGMA synchronous=NORMAL;")
-_conn.execute("PRAGMA busy_timeout=5000;")
 
-checkpointer = SqliteSaver(_conn)
-checkpointer.setup()  # Initialization such as table creation :contentReference[oaicite:4]{index=4}
+# ----------------------------
+# Semantic caches
+# ----------------------------
+# Exact (hash) + near-duplicate (embedding) caches: one for whole-pipeline
+# results keyed on the theme, one for individual Tavily queries inside the
+# research loop. Both draw connections from the shared lazy pool; embeddings
+# go through the async client so lookups never block the event loop.
+_embeddings = OpenAIEmbeddings(
+    model="text-embedding-3-small", http_async_client=_http_async_client
+)
 
-graph_app = builder.compile(checkpointer=checkpointer)
+theme_cache = SemanticCache(
+    _pool,
+    _embeddings.aembed_query,
+    table="semantic_cache_theme",
+    ttl_seconds=86400,
+)
+tool_query_cache = SemanticCache(
+    _pool,
+    _embeddings.aembed_query,
+    table="semantic_cache_tool_query",
+    ttl_seconds=3600,
+)
 
 
 # ----------------------------
@@ -288,6 +556,25 @@ def _as_text(m: object) -> str:
     return str(m)
 
 
+def _usage_summary(result: dict) -> dict:
+    """
+    Aggregate token usage across all AI messages in the run, including how many
+    input tokens were served from the provider's prompt cache (OpenAI reports
+    these under input_token_details.cache_read).
+    """
+    totals = {"input_tokens": 0, "output_tokens": 0, "cache_read_input_tokens": 0}
+    for key in ("research_messages", "analysis_messages"):
+        for m in result.get(key, []) or []:
+            usage = getattr(m, "usage_metadata", None)
+            if not usage:
+                continue
+            totals["input_tokens"] += usage.get("input_tokens", 0) or 0
+            totals["output_tokens"] += usage.get("output_tokens", 0) or 0
+            details = usage.get("input_token_details") or {}
+            totals["cache_read_input_tokens"] += details.get("cache_read", 0) or 0
+    return totals
+
+
 def serialize_result(result: dict) -> dict:
     """
     Since LangGraph return values may include message objects, convert them into a JSON-serializable form
@@ -301,6 +588,7 @@ def serialize_result(result: dict) -> dict:
         return {
             "status": "interrupted",
             "interrupt": payload,
+            "usage": _usage_summary(result),
         }
 
     analysis = result.get("analysis_messages", [])
@@ -314,33 +602,106 @@ def serialize_result(result: dict) -> dict:
         "status": "completed",
         "report": report_text,
         "analysis_messages": analysis_serialized,
+        "usage": _usage_summary(result),
     }
 
 
-def run_graph_start(theme: str, thread_id: str) -> dict:
+async def run_graph_start(theme: str, thread_id: str) -> dict:
+    # A semantically equivalent theme whose run already completed can
+    # short-circuit the whole research pipeline. Only finished reports are
+    # cached (see run_graph_resume), and the replayed payload carries no
+    # live thread_id — nothing to resume, nobody else's checkpoint to touch.
+    cached = await theme_cache.get(theme)
+    if cached is not None:
+        logger.debug("Semantic cache hit (theme): %s", theme)
+        return cached
+
     initial_state: dict = {
         "research_messages": [HumanMessage(content=f"Theme: {theme}")],
         "loop_count": 0,
         "analysis_messages": [],
+        "tool_query_memo": {},
+        "theme": theme,
     }
     config = {"configurable": {"thread_id": thread_id}}
-    raw = graph_app.invoke(initial_state, config=config)
+    graph_app = await _get_graph_app()
+    raw = await graph_app.ainvoke(initial_state, config=config)
     return serialize_result(raw)
 
 
-def run_graph_resume(decision: str, thread_id: str) -> dict:
+async def run_graph_resume(decision: str, thread_id: str) -> dict:
     config = {"configurable": {"thread_id": thread_id}}
-    raw = graph_app.invoke(Command(resume=decision), config=config)
-    return serialize_result(raw)
+    graph_app = await _get_graph_app()
+    raw = await graph_app.ainvoke(Command(resume=decision), config=config)
+    result = serialize_result(raw)
+    # A fresh start always stops at the approval interrupt, so the approved
+    # resume is the only point where a full report exists to cache. Skip the
+    # "n" path: it also ends the run but without generating a report.
+    if decision == "y" and result.get("status") == "completed":
+        theme = raw.get("theme")
+        if theme:
+            await theme_cache.put(theme, result)
+    return result
+
+
+async def stream_graph_events(
+    action: str,
+    thread_id: str,
+    theme: str | None = None,
+    decision: str | None = None,
+):
+    """
+    Run the graph and yield {"event", "data"} dicts: a "token" event for each
+    chunk of the final report as the LLM generates it (so clients see output
+    immediately instead of waiting for the full invoke), then one "result"
+    event with the same serialized payload the /invoke endpoint returns.
+    """
+    if action == "start":
+        input_obj: object = {
+            "research_messages": [HumanMessage(content=f"Theme: {theme}")],
+            "loop_count": 0,
+            "analysis_messages": [],
+            "tool_query_memo": {},
+            "theme": theme,
+        }
+    else:
+        input_obj = Command(resume=decision)
+
+    config = {"configurable": {"thread_id": thread_id}}
+    graph_app = await _get_graph_app()
+
+    async for event in graph_app.astream_events(input_obj, config=config, version="v2"):
+        if event["event"] != "on_chat_model_stream":
+            continue
+        # Only the report is worth streaming; intermediate agents stay silent.
+        if event.get("metadata", {}).get("langgraph_node") != "report_agent":
+            continue
+        chunk = event["data"]["chunk"]
+        text = chunk.content if isinstance(chunk.content, str) else str(chunk.content)
+        if text:
+            yield {"event": "token", "data": text}
+
+    # The run has either finished or stopped at an interrupt; serialize the
+    # final checkpointed state the same way the blocking endpoints do.
+    snapshot = await graph_app.aget_state(config)
+    values = dict(snapshot.values)
+    interrupts = getattr(snapshot, "interrupts", ()) or ()
+    if interrupts:
+        values["__interrupt__"] = list(interrupts)
+    yield {"event": "result", "data": {"thread_id": thread_id, **serialize_result(values)}}
 
 
 def new_thread_id() -> str:
     return str(uuid.uuid4())
 
 
-def close_checkpointer() -> None:
-    global _conn
-    try:
-        _conn.close()
-    except Exception:
-        pass
\ No newline at end of file
+async def close_checkpointer() -> None:
+    global _aconn
+    if _aconn is not None:
+        try:
+            await _aconn.close()
+        except Exception:
+            pass
+        _aconn = None
+    # Checkpoints the WAL (TRUNCATE) before closing the cache connections.
+    _pool.close()
\ No newline at end of file
@@ -0,0 +1,95 @@
+# backend/db.py
+from __future__ import annotations
+
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Applied to every connection. wal_autocheckpoint keeps the WAL from growing
+# unbounded between the explicit TRUNCATE checkpoint on shutdown.
+_PRAGMAS = (
+    "PRAGMA journal_mode=WAL;",
+    "PRAGMA synchronous=NORMAL;",
+    "PRAGMA busy_timeout=5000;",
+    "PRAGMA wal_autocheckpoint=1000;",
+)
+
+
+class SqliteConnectionPool:
+    """
+    Lazy SQLite connection pool. Nothing touches the database file until the
+    first `read()` or `write()` call, so importing a module that merely
+    declares a pool stays free of I/O.
+
+    Under WAL several readers may run concurrently but there is only ever one
+    writer at a time, so the pool hands out `pool_size` reader connections
+    from a queue and funnels all writes through one dedicated connection
+    guarded by a lock.
+    """
+
+    def __init__(self, path: str, pool_size: int = 4) -> None:
+        self._path = path
+        self._pool_size = pool_size
+        self._readers: queue.Queue[sqlite3.Connection] | None = None
+        self._writer: sqlite3.Connection | None = None
+        self._writer_lock = threading.Lock()
+        self._init_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        # check_same_thread=False is OK: access is serialized by the queue
+        # (readers) and the lock (writer).
+        conn = sqlite3.connect(self._path, check_same_thread=False)
+        for pragma in _PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _ensure_open(self) -> None:
+        if self._readers is not None:
+            return
+        with self._init_lock:
+            if self._readers is None:
+                self._writer = self._connect()
+                readers: queue.Queue[sqlite3.Connection] = queue.Queue()
+                for _ in range(self._pool_size):
+                    readers.put(self._connect())
+                self._readers = readers
+
+    @contextmanager
+    def read(self):
+        self._ensure_open()
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    @contextmanager
+    def write(self):
+        self._ensure_open()
+        with self._writer_lock:
+            yield self._writer
+
+    def close(self) -> None:
+        if self._readers is None:
+            return
+        try:
+            # Fold the WAL back into the main database file on graceful
+            # shutdown so it does not accumulate across restarts.
+            with self.write() as conn:
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+        except Exception:
+            pass
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+            except Exception:
+                pass
+        try:
+            self._writer.close()
+        except Exception:
+            pass
+        self._readers = None
+        self._writer = None
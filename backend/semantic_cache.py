@@ -0,0 +1,181 @@
+# backend/semantic_cache.py
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import time
+from typing import Awaitable, Callable, Optional
+
+from db import SqliteConnectionPool
+
+logger = logging.getLogger("agent.cache")
+
+
+def _cosine_similarity(a: list[float], b: list[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm_a = math.sqrt(sum(x * x for x in a))
+    norm_b = math.sqrt(sum(x * x for x in b))
+    if norm_a == 0.0 or norm_b == 0.0:
+        return 0.0
+    return dot / (norm_a * norm_b)
+
+
+class SemanticCache:
+    """
+    Small semantic cache on top of SQLite.
+
+    Lookup is two-tier: an exact hit via a hash of the normalized key text
+    (indexed, O(1)), then a brute-force cosine-similarity scan over the most
+    recent `max_scan` rows for "almost the same" keys. Values are arbitrary
+    JSON-serializable objects; rows expire after `ttl_seconds`.
+
+    `get`/`put` are coroutines: `embed` must be an async embedding function
+    (e.g. OpenAIEmbeddings.aembed_query) and the sqlite calls run via
+    asyncio.to_thread, so cache misses never block the event loop.
+
+    Connections come from a SqliteConnectionPool, so constructing a cache does
+    no I/O; the table is created on first use.
+    """
+
+    def __init__(
+        self,
+        pool: SqliteConnectionPool,
+        embed: Callable[[str], Awaitable[list[float]]],
+        table: str,
+        ttl_seconds: int = 86400,
+        threshold: float = 0.95,
+        max_scan: int = 200,
+    ) -> None:
+        self._pool = pool
+        self._embed = embed
+        self._table = table
+        self._ttl = ttl_seconds
+        self._threshold = threshold
+        self._max_scan = max_scan
+        self._table_ready = False
+
+    def _ensure_table(self) -> None:
+        if self._table_ready:
+            return
+        with self._pool.write() as conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self._table} ("
+                "key_hash TEXT PRIMARY KEY, "
+                "key_text TEXT NOT NULL, "
+                "embedding TEXT NOT NULL, "
+                "value TEXT NOT NULL, "
+                "ts INTEGER NOT NULL)"
+            )
+            conn.commit()
+        self._table_ready = True
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return " ".join(text.strip().lower().split())
+
+    @staticmethod
+    def _hash(normalized: str) -> str:
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    # Blocking sqlite helpers; only ever called through asyncio.to_thread.
+    def _read_exact(self, key_hash: str, min_ts: int):
+        self._ensure_table()
+        with self._pool.read() as conn:
+            return conn.execute(
+                f"SELECT value FROM {self._table} WHERE key_hash = ? AND ts >= ?",
+                (key_hash, min_ts),
+            ).fetchone()
+
+    def _read_recent(self, min_ts: int):
+        self._ensure_table()
+        with self._pool.read() as conn:
+            return conn.execute(
+                f"SELECT embedding, value FROM {self._table} "
+                "WHERE ts >= ? ORDER BY ts DESC LIMIT ?",
+                (min_ts, self._max_scan),
+            ).fetchall()
+
+    def _write(
+        self,
+        key_hash: str,
+        normalized: str,
+        embedding_json: str,
+        value_json: str,
+        now: int,
+    ) -> None:
+        self._ensure_table()
+        with self._pool.write() as conn:
+            # Expired rows are invisible to reads but would otherwise pile up
+            # forever (and crowd stale entries into the tier-2 scan window);
+            # sweep them out whenever we are writing anyway.
+            conn.execute(
+                f"DELETE FROM {self._table} WHERE ts < ?", (now - self._ttl,)
+            )
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self._table} "
+                "(key_hash, key_text, embedding, value, ts) VALUES (?, ?, ?, ?, ?)",
+                (key_hash, normalized, embedding_json, value_json, now),
+            )
+            conn.commit()
+
+    async def get(self, text: str) -> Optional[object]:
+        # The cache sits on the serving path, so it must never take a request
+        # down with it: any failure (embeddings outage, sqlite trouble)
+        # degrades to a miss and the caller proceeds uncached.
+        try:
+            return await self._lookup(text)
+        except Exception:
+            logger.warning(
+                "Semantic cache lookup failed (%s); treating as miss",
+                self._table,
+                exc_info=True,
+            )
+            return None
+
+    async def _lookup(self, text: str) -> Optional[object]:
+        normalized = self._normalize(text)
+        min_ts = int(time.time()) - self._ttl
+
+        # Tier 1: exact match on the hash.
+        row = await asyncio.to_thread(self._read_exact, self._hash(normalized), min_ts)
+        if row:
+            return json.loads(row[0])
+
+        # Tier 2: cosine similarity against the most recent entries.
+        rows = await asyncio.to_thread(self._read_recent, min_ts)
+        if not rows:
+            return None
+
+        query_embedding = await self._embed(normalized)
+        best_value = None
+        best_score = self._threshold
+        for embedding_json, value_json in rows:
+            score = _cosine_similarity(query_embedding, json.loads(embedding_json))
+            if score >= best_score:
+                best_score = score
+                best_value = value_json
+        return json.loads(best_value) if best_value is not None else None
+
+    async def put(self, text: str, value: object) -> None:
+        # Best effort, same rationale as get(): a failed write just means the
+        # next lookup misses.
+        try:
+            normalized = self._normalize(text)
+            embedding = await self._embed(normalized)
+            await asyncio.to_thread(
+                self._write,
+                self._hash(normalized),
+                normalized,
+                json.dumps(embedding),
+                json.dumps(value),
+                int(time.time()),
+            )
+        except Exception:
+            logger.warning(
+                "Semantic cache write failed (%s); skipping",
+                self._table,
+                exc_info=True,
+            )
@@ -1,10 +1,14 @@
 # backend/server.py
 from __future__ import annotations
 
-from typing import Optional, Literal, Union
+import json
+import logging
+import os
+from typing import Optional, Literal
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field
 
 from langchain_core.runnables import RunnableLambda
 from langserve import add_routes
@@ -13,20 +17,32 @@ from agent_graph import (
     new_thread_id,
     run_graph_start,
     run_graph_resume,
+    stream_graph_events,
 )
 
 from contextlib import asynccontextmanager
 from agent_graph import close_checkpointer
 
+# Verbosity for the whole process (including the "agent" logger) comes from
+# the LOG_LEVEL env var; uvicorn keeps its own handlers.
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
+logger = logging.getLogger("agent.server")
+
 # ----------------------------
 # FastAPI app
 # ----------------------------
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     yield
-    close_checkpointer()
-
-app = FastAPI(title="LangServe + LangGraph HITL Agent", lifespan=lifespan)
+    await close_checkpointer()
+
+# orjson encodes the multi-KB report payloads several times faster than the
+# stdlib json encoder FastAPI defaults to.
+app = FastAPI(
+    title="LangServe + LangGraph HITL Agent",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 # Allow CORS during development so we can call it from Live Server (e.g., http://127.0.0.1:5500)
 app.add_middleware(
@@ -41,39 +57,47 @@ app.add_middleware(
 # Input/Output Schema
 # ----------------------------
 class AgentRequest(BaseModel):
+    # Frozen + ignore extras: requests are read-only once validated, and this
+    # keeps validation to the single pass LangServe already performs via
+    # .with_types(input_type=AgentRequest).
+    model_config = ConfigDict(frozen=True, validate_assignment=False, extra="ignore")
+
     action: Literal["start", "resume"] = Field(..., description="start or resume")
     thread_id: Optional[str] = Field(None, description="ID to resume within the same thread")
     theme: Optional[str] = Field(None, description="Theme for start")
     decision: Optional[str] = Field(None, description="Input for resume (y/n/retry)")
 
 
-def agent_entry(req: Union[AgentRequest, dict]) -> dict:
-    # LangServe’s /invoke accepts { input: ... }, and sometimes the runnable receives the inner dict.
-    # If it’s a dict, wrap it into AgentRequest so we can use attribute access.
+async def agent_entry(req: AgentRequest) -> dict:
+    # LangServe validates against AgentRequest but hands the runnable a plain
+    # dict (its _unpack_input dumps non-Serializable input models), so
+    # re-hydrate here before touching attributes.
     if isinstance(req, dict):
-        req = AgentRequest(**req)
+        req = AgentRequest.model_validate(req)
 
     # If thread_id is missing, issue a new one on start.
     tid = req.thread_id or new_thread_id()
 
-    print(f"[agent_entry] action={req.action} thread_id={tid}")
+    logger.info("[agent_entry] action=%s thread_id=%s", req.action, tid)
 
     if req.action == "start":
         theme = req.theme or "Space debris removal business"
-        print(f"[agent_entry] start theme={theme}")  
-        data = run_graph_start(theme=theme, thread_id=tid)
-        print(f"[agent_entry] start done status={data.get('status')}")  
+        logger.info("[agent_entry] start theme=%s", theme)
+        data = await run_graph_start(theme=theme, thread_id=tid)
+        logger.info("[agent_entry] start done status=%s", data.get("status"))
         return {"thread_id": tid, **data}
 
     # resume
     decision = (req.decision or "").strip().lower()
-    print(f"[agent_entry] resume decision={decision}")  
-    data = run_graph_resume(decision=decision, thread_id=tid)
-    print(f"[agent_entry] resume done status={data.get('status')}")  
+    logger.info("[agent_entry] resume decision=%s", decision)
+    data = await run_graph_resume(decision=decision, thread_id=tid)
+    logger.info("[agent_entry] resume done status=%s", data.get("status"))
     return {"thread_id": tid, **data}
 
 
 runnable = (
+    # RunnableLambda detects the coroutine function and exposes it as the async
+    # path, so LangServe awaits it natively instead of running it in a thread.
     RunnableLambda(agent_entry)
     # LangServe may fail schema generation via input-type inference, so specify it explicitly.
     .with_types(input_type=AgentRequest, output_type=dict)
@@ -83,5 +107,28 @@ runnable = (
 # Automatically generates endpoints such as POST /agent/invoke
 add_routes(app, runnable, path="/agent")
 
+
+# SSE variant of the agent endpoint: report tokens arrive as they are
+# generated ("token" events), followed by one "result" event carrying the
+# same payload /agent/invoke would return. /agent/invoke stays as-is for
+# clients that prefer a single JSON response.
+# NOTE: add_routes above already owns POST /agent/stream (and Starlette
+# dispatches in registration order), so this lives at its own path.
+@app.post("/agent/report_stream")
+async def agent_stream(req: AgentRequest):
+    tid = req.thread_id or new_thread_id()
+
+    async def event_source():
+        async for ev in stream_graph_events(
+            action=req.action,
+            thread_id=tid,
+            theme=req.theme or "Space debris removal business",
+            decision=(req.decision or "").strip().lower(),
+        ):
+            data = json.dumps(ev["data"], ensure_ascii=False)
+            yield f"event: {ev['event']}\ndata: {data}\n\n"
+
+    return StreamingResponse(event_source(), media_type="text/event-stream")
+
 # run:
 # uvicorn server:app --reload --port 8000
\ No newline at end of file
@@ -0,0 +1,43 @@
+# backend/smoke_test_server.py
+"""
+Smoke check for the SSE endpoint: POST /agent/report_stream must dispatch to
+agent_stream. (An earlier version lived at /agent/stream, which add_routes
+already owns, so LangServe's handler shadowed it and the endpoint was dead.)
+
+Run from backend/:  python smoke_test_server.py
+No network or API keys needed — the graph runner is stubbed before the request.
+"""
+from __future__ import annotations
+
+import os
+
+# server imports agent_graph, whose clients validate keys at construction.
+os.environ.setdefault("OPENAI_API_KEY", "smoke-test")
+os.environ.setdefault("TAVILY_API_KEY", "smoke-test")
+
+from fastapi.testclient import TestClient
+
+import server
+
+
+async def _fake_stream_graph_events(action, thread_id, theme=None, decision=None):
+    yield {"event": "token", "data": "Hello"}
+    yield {"event": "result", "data": {"thread_id": thread_id, "status": "completed"}}
+
+
+def main() -> None:
+    server.stream_graph_events = _fake_stream_graph_events
+    with TestClient(server.app) as client:
+        resp = client.post(
+            "/agent/report_stream", json={"action": "start", "theme": "smoke"}
+        )
+        assert resp.status_code == 200, (resp.status_code, resp.text)
+        assert resp.headers["content-type"].startswith("text/event-stream"), (
+            resp.headers
+        )
+        assert "event: token" in resp.text and "event: result" in resp.text, resp.text
+    print("OK: /agent/report_stream dispatches to agent_stream")
+
+
+if __name__ == "__main__":
+    main()
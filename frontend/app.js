@@ -39,8 +39,7 @@ const NODE_LABEL = {
   research_agent: "Research (research_agent)",
   tools: "Search (tools)",
   summary_agent: "Summary (summary_agent)",
-  market_agent: "Market analysis (market_agent)",
-  technical_agent: "Technical review (technical_agent)",
+  market_and_technical_agent: "Market analysis + technical review (market_and_technical_agent)",
   human_approval: "Awaiting approval (human_approval)",
   report_agent: "Report generation (report_agent)",
 };
@@ -1,34 +1,42 @@
 # graphs/agent_graph.py
 from __future__ import annotations
 
+import asyncio
+import json
+import logging
 import os
+import uuid
 import datetime as _dt
 from typing import Annotated, Literal
 from typing_extensions import TypedDict
 
+import httpx
 from langchain_openai import ChatOpenAI
-from langchain_core.messages import BaseMessage
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    RemoveMessage,
+    SystemMessage,
+    ToolMessage,
+)
 from langchain_core.tools import tool
 
 from langgraph.graph import END, START, StateGraph
-from langgraph.graph.message import add_messages
-from langgraph.prebuilt import ToolNode
+from langgraph.graph.message import add_messages, REMOVE_ALL_MESSAGES
 from langgraph.types import Command, interrupt
 
 # ----------------------------
 # Settings
 # ----------------------------
 MODEL_NAME = os.getenv("MODEL_NAME", "gpt-5-mini")
-DEBUG_MODE = os.getenv("DEBUG_MODE", "true").lower() == "true"
 MAX_TOOL_LOOPS = int(os.getenv("MAX_TOOL_LOOPS", "3"))
 TODAY_STR = _dt.date.today().isoformat()
 
-
-def print_debug(title: str, content: str) -> None:
-    if not DEBUG_MODE:
-        return
-    print(f"\n🐛 [DEBUG] {title}:\n{content}\n" + "-" * 40)
+# Verbosity is driven by the LOG_LEVEL env var; logging defers argument
+# formatting entirely when DEBUG is disabled.
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
+logger = logging.getLogger("agent")
 
 
 # ----------------------------
@@ -46,11 +54,11 @@ def _format_tavily_results(tavily_response: object) -> str:
     for i, r in enumerate(results, 1):
         if not isinstance(r, dict):
             continue
-        title = (r.get("title") or "").strip()
+        title = (r.get("title") or "").strip()[:200]
         content = (r.get("content") or r.get("raw_content") or "").strip()
-        url = (r.get("url") or "").strip()
+        url = (r.get("url") or "").strip()[:300]
 
-        # Cap content length to avoid bloating logs/prompts
+        # Cap field lengths to avoid bloating logs/prompts
         if len(content) > 900:
             content = content[:900] + "…"
 
@@ -65,7 +73,7 @@ def _build_tools():
     if not tavily_key:
 
         @tool
-        def tavily_search_formatted(query: str) -> str:
+        async def tavily_search_formatted(query: str) -> str:
             """Web search (Tavily). If no API key is set, return a helpful message."""
             return (
                 "(Web search is unavailable because TAVILY_API_KEY is not set.)\n"
@@ -85,10 +93,10 @@ def _build_tools():
     )
 
     @tool
-    def tavily_search_formatted(query: str) -> str:
+    async def tavily_search_formatted(query: str) -> str:
         """Web search (Tavily). Returns a formatted list of top results."""
         try:
-            tavily_response = tavily_search.invoke({"query": query})
+            tavily_response = await tavily_search.ainvoke({"query": query})
             return _format_tavily_results(tavily_response)
         except Exception as e:
             return f"(Error during Tavily search) {type(e).__name__}: {e}"
@@ -102,13 +110,22 @@ tools = _build_tools()
 # ----------------------------
 # State
 # ----------------------------
+def _merge_tool_memo(left: dict | None, right: dict | None) -> dict:
+    # Reducer for the per-thread tool memo; later entries win on collision.
+    return {**(left or {}), **(right or {})}
+
+
 class State(TypedDict, total=False):
     # add_messages reducer: messages passed via `update` are appended to the existing list
     research_messages: Annotated[list[BaseMessage], add_messages]
     analysis_messages: Annotated[list[BaseMessage], add_messages]
     loop_count: int
 
-    # For UI (set at the start of each step)
+    # Memo of tool results for this thread, so the LLM repeating a query
+    # across loop iterations does not repeat the external call.
+    tool_query_memo: Annotated[dict[str, str], _merge_tool_memo]
+
+    # For UI (each node sets this alongside its regular update)
     current_step: str
     approval_decision: str
 
@@ -117,9 +134,19 @@ class State(TypedDict, total=False):
 
 
 # ----------------------------
-# Model / Chains
+# Model / Prompts
 # ----------------------------
-model = ChatOpenAI(model=MODEL_NAME, temperature=0)
+# Shared HTTP client with a larger keep-alive pool than httpx's default, so
+# the parallel market/technical calls and concurrent tool loops do not queue
+# waiting for a free socket.
+_http_async_client = httpx.AsyncClient(
+    limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+    timeout=httpx.Timeout(60.0, connect=10.0),
+)
+
+model = ChatOpenAI(
+    model=MODEL_NAME, temperature=0, http_async_client=_http_async_client
+)
 model_with_tools = model.bind_tools(tools)
 
 research_prompt_text = f"""
@@ -133,156 +160,239 @@ Use the most appropriate tools as needed.
 - Do not invent sources or citations.
 """.strip()
 
-research_prompt = ChatPromptTemplate.from_messages(
-    [
-        ("system", research_prompt_text),
-        MessagesPlaceholder(variable_name="research_messages"),
-    ]
+# Precomputed message objects: prompts here are fixed, so there is no need to
+# run ChatPromptTemplate formatting and placeholder resolution on every call —
+# each node just prepends its system message to the history.
+# NOTE: keep static content first so OpenAI's automatic prefix caching can
+# reuse the identical prefix across calls.
+RESEARCH_SYSTEM = SystemMessage(content=research_prompt_text)
+
+SUMMARY_SYSTEM = SystemMessage(
+    content="You are a skilled note-taker. Summarize the following 'research log' and produce a baseline report the market analysis team can use.\n"
+    "For factual claims, add [n] wherever possible, and include a references section at the end ([n] URL). Do not invent sources.\n"
+    "Treat only 'source: URL' lines contained in tool outputs as eligible references."
 )
-research_chain = research_prompt | model_with_tools
-
-summary_prompt = ChatPromptTemplate.from_messages(
-    [
-        (
-            "system",
-            "You are a skilled note-taker. Summarize the following 'research log' and produce a baseline report the market analysis team can use.\n"
-            "For factual claims, add [n] wherever possible, and include a references section at the end ([n] URL). Do not invent sources.\n"
-            "Treat only 'source: URL' lines contained in tool outputs as eligible references.",
-        ),
-        ("human", "Here is the research log:"),
-        MessagesPlaceholder(variable_name="research_messages"),
-        ("human", "Based on the above, write a baseline report for market analysis."),
-    ]
+SUMMARY_LOG_INTRO = HumanMessage(content="Here is the research log:")
+SUMMARY_INSTRUCTION = HumanMessage(
+    content="Based on the above, write a baseline report for market analysis."
 )
-summary_chain = summary_prompt | model
 
-market_prompt = ChatPromptTemplate.from_messages(
-    [
-        ("system", "You are a market analysis professional. Perform a SWOT analysis based on the report."),
-        MessagesPlaceholder(variable_name="analysis_messages"),
-    ]
+MARKET_SYSTEM = SystemMessage(
+    content="You are a market analysis professional. Perform a SWOT analysis based on the report."
 )
-market_chain = market_prompt | model
-
-technical_prompt = ChatPromptTemplate.from_messages(
-    [
-        ("system", "You are the CTO. Based on the market analysis, identify technical risks, challenges, and feasibility considerations."),
-        MessagesPlaceholder(variable_name="analysis_messages"),
-    ]
+TECHNICAL_SYSTEM = SystemMessage(
+    content="You are the CTO. Based on the market analysis, identify technical risks, challenges, and feasibility considerations."
 )
-technical_chain = technical_prompt | model
-
-report_prompt = ChatPromptTemplate.from_messages(
-    [
-        (
-            "system",
-            "Synthesize the discussion so far and write a concrete business plan aimed at investors.\n"
-            "Do not end with questions or suggestions. End with 'End of report.'",
-        ),
-        MessagesPlaceholder(variable_name="analysis_messages"),
-    ]
+
+REPORT_SYSTEM = SystemMessage(
+    content="Synthesize the discussion so far and write a concrete business plan aimed at investors.\n"
+    "Do not end with questions or suggestions. End with 'End of report.'"
 )
-report_chain = report_prompt | model
 
+_REPORT_STAGES = ("summary", "market", "technical")
 
-# ----------------------------
-# Utility: start-marker nodes
-# ----------------------------
-def _mark_step(step: str, goto: str) -> Command:
-    # Lightweight node that updates `current_step` at the start of each step
-    return Command(update={"current_step": step}, goto=goto)
+
+def _compact_report_context(messages: list[BaseMessage]) -> list[BaseMessage]:
+    """
+    The report only needs the finished artifacts: the latest summary, market
+    and technical messages (tagged via additional_kwargs["stage"]). On retry
+    threads this skips the superseded attempts and keeps the report prompt
+    short. Falls back to the full history if no tags are present.
+    """
+    latest: dict[str, BaseMessage] = {}
+    for m in messages:
+        stage = getattr(m, "additional_kwargs", {}).get("stage")
+        if stage in _REPORT_STAGES:
+            latest[stage] = m
+    picked = [latest[s] for s in _REPORT_STAGES if s in latest]
+    return picked if picked else list(messages)
 
 
 # ----------------------------
 # Nodes
 # ----------------------------
-def research_start(state: State) -> Command[Literal["research_agent"]]:
-    print_debug("Node", "research_start")
-    return _mark_step("research_agent", "research_agent")
-
-
-def research_agent(state: State) -> Command[Literal["tools_start", "summary_start"]]:
-    print_debug("Node", "research_agent")
-
-    response = research_chain.invoke({"research_messages": state.get("research_messages", [])})
-    update = {"research_messages": [response]}
+# Each node folds its own `current_step` update into its regular state update.
+# (The previous *_start marker nodes each cost a full checkpoint write just to
+# set `current_step`, doubling the DB transactions per run.)
+async def research_agent(state: State) -> Command[Literal["tools", "summary_agent"]]:
+    logger.debug("Node: %s", "research_agent")
+
+    response = await model_with_tools.ainvoke(
+        [RESEARCH_SYSTEM, *state.get("research_messages", [])]
+    )
+    update = {"research_messages": [response], "current_step": "research_agent"}
     current_count = state.get("loop_count", 0)
 
     # If the LLM requests tool calls, route to tools
     if getattr(response, "tool_calls", None):
         if current_count < MAX_TOOL_LOOPS:
-            return Command(update=update, goto="tools_start")
-        return Command(update=update, goto="summary_start")
+            return Command(update=update, goto="tools")
+        return Command(update=update, goto="summary_agent")
+
+    return Command(update=update, goto="summary_agent")
+
 
-    return Command(update=update, goto="summary_start")
+tools_by_name = {t.name: t for t in tools}
 
+# Cap concurrent tool executions so a single LLM turn with many tool calls
+# cannot exhaust sockets or the search API quota.
+_tool_semaphore = asyncio.Semaphore(4)
+
+
+async def _execute_tool_call(tool_call: dict) -> ToolMessage:
+    async with _tool_semaphore:
+        try:
+            output = await tools_by_name[tool_call["name"]].ainvoke(tool_call["args"])
+        except Exception as e:
+            output = f"(Error during tool execution) {type(e).__name__}: {e}"
+    content = output if isinstance(output, str) else str(output)
+    # Assign the id up front: add_messages dedupes by message id, and messages
+    # that arrive with one take its fast path instead of a linear scan.
+    return ToolMessage(
+        content=content,
+        name=tool_call["name"],
+        tool_call_id=tool_call["id"],
+        id=str(uuid.uuid4()),
+    )
 
-def tools_start(state: State) -> Command[Literal["tools"]]:
-    print_debug("Node", "tools_start")
-    return _mark_step("tools", "tools")
 
+def _memo_key(tool_call: dict) -> str:
+    args = tool_call.get("args") or {}
+    query = args.get("query")
+    if isinstance(query, str):
+        normalized = " ".join(query.strip().lower().split())
+        return f"{tool_call['name']}:{normalized}"
+    return f"{tool_call['name']}:{json.dumps(args, sort_keys=True)}"
 
-tool_node = ToolNode(tools, messages_key="research_messages")
 
+async def research_tool_node(state: State) -> Command[Literal["research_agent"]]:
+    logger.debug("Node: %s", "tools")
 
-def research_tool_node(state: State) -> Command[Literal["research_start"]]:
-    print_debug("Node", "tools")
+    # The LLM may request several searches in one turn; run them concurrently
+    # instead of ToolNode's serial execution. The LLM also tends to repeat
+    # queries across loop iterations, so results already seen on this thread
+    # (or duplicated within the turn) come from the memo instead of the tool.
+    messages = state.get("research_messages", [])
+    tool_calls = (getattr(messages[-1], "tool_calls", None) or []) if messages else []
 
-    result = tool_node.invoke({"research_messages": state.get("research_messages", [])})
+    memo = state.get("tool_query_memo") or {}
+    pending: dict[str, dict] = {}
+    for tc in tool_calls:
+        key = _memo_key(tc)
+        if key not in memo and key not in pending:
+            pending[key] = tc
 
-    last_message = result["research_messages"][-1]
-    tool_text = last_message.content
-    tool_text = tool_text if isinstance(tool_text, str) else str(tool_text)
-    print_debug("Tool Output", tool_text[:300] + ("... (truncated)" if len(tool_text) > 300 else ""))
+    executed = await asyncio.gather(
+        *(_execute_tool_call(tc) for tc in pending.values())
+    )
+    executed_by_key = dict(zip(pending.keys(), executed))
+
+    new_memo: dict[str, str] = {}
+    tool_messages: list[ToolMessage] = []
+    for tc in tool_calls:
+        key = _memo_key(tc)
+        if key in memo:
+            logger.debug("Tool memo hit: %s", key)
+            content = memo[key]
+        else:
+            content = executed_by_key[key].content
+            # Do not memoize failures; the next loop should retry them.
+            if not content.startswith("(Error"):
+                new_memo[key] = content
+        tool_messages.append(
+            ToolMessage(
+                content=content,
+                name=tc["name"],
+                tool_call_id=tc["id"],
+                id=str(uuid.uuid4()),
+            )
+        )
+
+    if logger.isEnabledFor(logging.DEBUG):
+        # Guarded: skip the str() + slice entirely when debug is off.
+        tool_text = tool_messages[-1].content if tool_messages else "(no tool calls)"
+        tool_text = tool_text if isinstance(tool_text, str) else str(tool_text)
+        logger.debug(
+            "Tool output: %s%s",
+            tool_text[:300],
+            "... (truncated)" if len(tool_text) > 300 else "",
+        )
 
     return Command(
         update={
-            "research_messages": result["research_messages"],
+            "research_messages": tool_messages,
             "loop_count": state.get("loop_count", 0) + 1,
+            "current_step": "tools",
+            "tool_query_memo": new_memo,
         },
-        goto="research_start",
+        goto="research_agent",
     )
 
 
-def summary_start(state: State) -> Command[Literal["summary_agent"]]:
-    print_debug("Node", "summary_start")
-    return _mark_step("summary_agent", "summary_agent")
-
-
-def summary_agent(state: State) -> Command[Literal["market_start"]]:
-    print_debug("Node", "summary_agent")
-    response = summary_chain.invoke({"research_messages": state.get("research_messages", [])})
+def _condense_research_messages(messages: list[BaseMessage]) -> list[BaseMessage]:
+    """
+    Build a compact research log for the summarizer: keep human messages
+    verbatim, keep only the prose content of AI messages (tool-call argument
+    blobs add nothing to a summary), and reduce each tool output to a short
+    snippet plus its "source:" lines so citations stay possible.
+    """
+    condensed: list[BaseMessage] = []
+    for m in messages:
+        if isinstance(m, ToolMessage):
+            text = m.content if isinstance(m.content, str) else str(m.content)
+            sources = [line for line in text.splitlines() if line.startswith("source:")]
+            condensed.append(
+                HumanMessage(content="\n".join(["[tool output]", text[:300], *sources]))
+            )
+        elif isinstance(m, AIMessage):
+            text = m.content if isinstance(m.content, str) else str(m.content)
+            if text.strip():
+                condensed.append(AIMessage(content=text))
+        else:
+            condensed.append(m)
+    return condensed
+
+
+async def summary_agent(state: State) -> Command[Literal["market_and_technical_agent"]]:
+    logger.debug("Node: %s", "summary_agent")
+    response = await model.ainvoke(
+        [
+            SUMMARY_SYSTEM,
+            SUMMARY_LOG_INTRO,
+            *_condense_research_messages(state.get("research_messages", [])),
+            SUMMARY_INSTRUCTION,
+        ]
+    )
+    response.additional_kwargs["stage"] = "summary"
     return Command(
-        update={"analysis_messages": [response], "loop_count": 0},
-        goto="market_start",
+        update={
+            "analysis_messages": [response],
+            "loop_count": 0,
+            "current_step": "summary_agent",
+        },
+        goto="market_and_technical_agent",
     )
 
 
-def market_start(state: State) -> Command[Literal["market_agent"]]:
-    print_debug("Node", "market_start")
-    return _mark_step("market_agent", "market_agent")
-
-
-def market_agent(state: State) -> Command[Literal["technical_start"]]:
-    print_debug("Node", "market_agent")
-    response = market_chain.invoke({"analysis_messages": state.get("analysis_messages", [])})
-    return Command(update={"analysis_messages": [response]}, goto="technical_start")
-
-
-def technical_start(state: State) -> Command[Literal["technical_agent"]]:
-    print_debug("Node", "technical_start")
-    return _mark_step("technical_agent", "technical_agent")
-
-
-def technical_agent(state: State) -> Command[Literal["human_approval_start"]]:
-    print_debug("Node", "technical_agent")
-    response = technical_chain.invoke({"analysis_messages": state.get("analysis_messages", [])})
-    return Command(update={"analysis_messages": [response]}, goto="human_approval_start")
-
-
-def human_approval_start(state: State) -> Command[Literal["human_approval"]]:
-    print_debug("Node", "human_approval_start")
-    return _mark_step("human_approval", "human_approval")
+async def market_and_technical_agent(state: State) -> Command[Literal["human_approval"]]:
+    # Both analyses read the same analysis_messages and are independent of
+    # each other, so issue the two HTTP requests concurrently on one client,
+    # without an extra checkpoint write between the two agents.
+    logger.debug("Node: %s", "market_and_technical_agent")
+    messages = state.get("analysis_messages", [])
+    market_response, technical_response = await asyncio.gather(
+        model.ainvoke([MARKET_SYSTEM, *messages]),
+        model.ainvoke([TECHNICAL_SYSTEM, *messages]),
+    )
+    market_response.additional_kwargs["stage"] = "market"
+    technical_response.additional_kwargs["stage"] = "technical"
+    return Command(
+        update={
+            "analysis_messages": [market_response, technical_response],
+            "current_step": "market_and_technical_agent",
+        },
+        goto="human_approval",
+    )
 
 
 def _safe_preview_messages(messages: list[BaseMessage], limit: int = 3) -> list[dict]:
@@ -297,16 +407,21 @@ def _safe_preview_messages(messages: list[BaseMessage], limit: int = 3) -> list[
     return out
 
 
-def human_approval_node(
+RETRY_COMPRESS_SYSTEM = SystemMessage(
+    content="Compress the following analysis thread into one concise base report that preserves the key findings of the summary, the SWOT analysis, and the technical assessment. Keep citation markers [n] and the reference list. The analysis team will redo their work with your text as the only context."
+)
+
+
+async def human_approval_node(
     state: State,
-) -> Command[Literal["market_start", "report_start", "__end__"]]:
+) -> Command[Literal["market_and_technical_agent", "report_agent", "__end__"]]:
     """
     HITL (approval) node.
     - `interrupt(payload)` stops execution reliably
     - The resumed value is stored in `approval_decision`
     - If the decision is not 'y', do not proceed to the report step
     """
-    print_debug("Node", "human_approval")
+    logger.debug("Node: %s", "human_approval")
 
     payload = {
         "kind": "approval_request",
@@ -316,7 +431,7 @@ def human_approval_node(
     }
 
     user_decision = interrupt(payload)
-    print_debug("Approval decision (raw)", repr(user_decision))
+    logger.debug("Approval decision (raw): %r", user_decision)
 
     if isinstance(user_decision, str):
         decision_str = user_decision.strip().lower()
@@ -326,30 +441,45 @@ def human_approval_node(
     if decision_str not in ("y", "retry", "n"):
         decision_str = "n"
 
-    update = {"approval_decision": decision_str}
+    update = {"approval_decision": decision_str, "current_step": "human_approval"}
 
     if decision_str == "y":
-        return Command(update=update, goto="report_start")
+        return Command(update=update, goto="report_agent")
     if decision_str == "retry":
-        return Command(update=update, goto="market_start")
+        # Each retry appends a fresh market + technical pair, so the prompt
+        # for the next attempt grows without bound. Collapse the thread into
+        # a single compressed base report before re-entering the analysis.
+        compressed = await model.ainvoke(
+            [RETRY_COMPRESS_SYSTEM, *state.get("analysis_messages", [])]
+        )
+        compressed.additional_kwargs["stage"] = "summary"
+        update["analysis_messages"] = [
+            RemoveMessage(id=REMOVE_ALL_MESSAGES),
+            compressed,
+        ]
+        return Command(update=update, goto="market_and_technical_agent")
     return Command(update=update, goto=END)
 
 
-def report_start(state: State) -> Command[Literal["report_agent"]]:
-    print_debug("Node", "report_start")
-    return _mark_step("report_agent", "report_agent")
-
-
-def report_agent(state: State) -> Command[Literal["__end__"]]:
-    print_debug("Node", "report_agent")
+async def report_agent(state: State) -> Command[Literal["__end__"]]:
+    logger.debug("Node: %s", "report_agent")
 
     if (state.get("approval_decision") or "").strip().lower() != "y":
         return Command(update={"final_report": ""}, goto=END)
 
-    response = report_chain.invoke({"analysis_messages": state.get("analysis_messages", [])})
+    response = await model.ainvoke(
+        [REPORT_SYSTEM, *_compact_report_context(state.get("analysis_messages", []))]
+    )
     text = response.content if isinstance(response.content, str) else str(response.content)
 
-    return Command(update={"analysis_messages": [response], "final_report": text}, goto=END)
+    return Command(
+        update={
+            "analysis_messages": [response],
+            "final_report": text,
+            "current_step": "report_agent",
+        },
+        goto=END,
+    )
 
 
 # ----------------------------
@@ -357,28 +487,14 @@ def report_agent(state: State) -> Command[Literal["__end__"]]:
 # ----------------------------
 builder = StateGraph(State)
 
-builder.add_node("research_start", research_start)
 builder.add_node("research_agent", research_agent)
-
-builder.add_node("tools_start", tools_start)
 builder.add_node("tools", research_tool_node)
-
-builder.add_node("summary_start", summary_start)
 builder.add_node("summary_agent", summary_agent)
-
-builder.add_node("market_start", market_start)
-builder.add_node("market_agent", market_agent)
-
-builder.add_node("technical_start", technical_start)
-builder.add_node("technical_agent", technical_agent)
-
-builder.add_node("human_approval_start", human_approval_start)
+builder.add_node("market_and_technical_agent", market_and_technical_agent)
 builder.add_node("human_approval", human_approval_node)
-
-builder.add_node("report_start", report_start)
 builder.add_node("report_agent", report_agent)
 
-builder.add_edge(START, "research_start")
+builder.add_edge(START, "research_agent")
 
 # Transitions are mostly handled via Command.goto (explicit edges kept minimal)
 builder.add_edge("report_agent", END)